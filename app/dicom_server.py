@@ -1,14 +1,25 @@
 import base64
+import contextlib
+import functools
+import hmac
 import io
+import ipaddress
+import itertools
+import json
 import logging
 import os
 import shutil
 import socket
+import struct
 import subprocess
+import sys
+import threading
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Iterable, List, Optional, Sequence, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
 
 import numpy as np
 from flask import (
@@ -24,8 +35,13 @@ from flask import (
     url_for,
 )
 from PIL import Image
+import pydicom.config
 from pydicom import dcmread
 from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.filereader import read_file_meta_info
+from pydicom.multival import MultiValue
+from pydicom.pixel_data_handlers.util import apply_modality_lut, apply_voi_lut
+from pydicom.pixel_data_handlers import gdcm_handler, pylibjpeg_handler
 from pydicom.uid import (
     DeflatedExplicitVRLittleEndian,
     ExplicitVRBigEndian,
@@ -81,8 +97,23 @@ ALLOW_IPS = [
     for ip in os.getenv("ALLOW_IPS", "127.0.0.1,::1").split(",")
     if ip.strip()
 ]
+USE_XSENDFILE = os.getenv("USE_XSENDFILE", "0").strip().lower() in {
+    "1",
+    "true",
+    "on",
+    "yes",
+}
 BRAND_TITLE = os.getenv("BRAND_TITLE", "LILI DICOM").strip() or "LILI DICOM"
 BRAND_COLOR = os.getenv("BRAND_COLOR", "#255375").strip() or "#255375"
+INDEX_TTL = float(os.getenv("INDEX_TTL", "300"))
+POST_STORE_WORKERS = max(int(os.getenv("POST_STORE_WORKERS", "2")), 1)
+POST_STORE_DELAY = float(os.getenv("POST_STORE_DELAY", "2.0"))
+# Large CT/MR series only ever show their first previews; 0 disables the cap.
+MAX_PREVIEWS_PER_SERIES = int(os.getenv("MAX_PREVIEWS_PER_SERIES", "64"))
+
+STUDY_MANIFEST = "_manifest.json"
+JPEG_SUFFIXES = {".jpg", ".jpeg"}
+PREVIEW_SUFFIXES = JPEG_SUFFIXES | {".png"}
 
 LOG_PATH = Path(__file__).parent / "dicom_server.log"
 logging.basicConfig(
@@ -95,53 +126,206 @@ logging.basicConfig(
 )
 LOGGER = logging.getLogger("lili_dicom")
 
+# Try the native (SIMD-enabled) decoders before pydicom's pure-Python fallbacks.
+pydicom.config.pixel_data_handlers = [pylibjpeg_handler, gdcm_handler] + [
+    handler
+    for handler in pydicom.config.pixel_data_handlers
+    if handler not in (pylibjpeg_handler, gdcm_handler)
+]
+if not pylibjpeg_handler.is_available():
+    LOGGER.warning("pylibjpeg unavailable: compressed DICOM previews will use slower decoders")
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
 
+# Target sample size for percentile estimation; p1/p99 converge well before this.
+PERCENTILE_SAMPLE = 250_000
+HISTOGRAM_MAX_BINS = 4096
+WINDOW_BLOCK_PIXELS = 256 * 1024
+
+
+def _percentile_ranks(n: int) -> Tuple[int, int]:
+    k_lo = min(max(int(0.01 * n), 1), n - 1)
+    k_hi = min(int(0.99 * n), n - 1)
+    return k_lo, k_hi
+
+
+def _histogram_window(hist: np.ndarray) -> Tuple[float, float]:
+    """1st/99th percentile window from a histogram whose bin index is the pixel value."""
+
+    cdf = np.cumsum(hist)
+    k_lo, k_hi = _percentile_ranks(int(cdf[-1]))
+    lo = float(np.searchsorted(cdf, k_lo, side="right"))
+    hi = float(np.searchsorted(cdf, k_hi, side="right"))
+    if hi <= lo:
+        present = np.flatnonzero(hist)
+        lo, hi = float(present[0]), float(present[-1])
+        if hi <= lo:
+            hi = lo + 1.0
+    return lo, hi
+
+
 def _percentile_window(arr: np.ndarray) -> Tuple[float, float]:
+    if arr.size == 0:
+        return 0.0, 1.0
+    if arr.dtype == np.uint8:
+        # Exact and O(N): a 256-bin histogram instead of a partial sort.
+        return _histogram_window(np.bincount(arr.ravel(), minlength=256))
+
+    step = max(1, int(np.sqrt(arr.size / PERCENTILE_SAMPLE)))
+    sample = arr[::step, ::step] if arr.ndim >= 2 else arr[:: step * step]
+    flat = sample.ravel()
+    if np.issubdtype(flat.dtype, np.floating):
+        flat = flat[np.isfinite(flat)]
+    if flat.size == 0:
+        return 0.0, 1.0
+    if flat.dtype.kind in "ui":
+        base, top = int(flat.min()), int(flat.max())
+        if top - base < HISTOGRAM_MAX_BINS:
+            # Up to 12 bits of dynamic range: a counting pass instead of a partial sort.
+            lo, hi = _histogram_window(np.bincount((flat - base).astype(np.intp, copy=False)))
+            return lo + base, hi + base
     try:
-        lo = float(np.percentile(arr, 1.0))
-        hi = float(np.percentile(arr, 99.0))
+        # One partial sort yields both the 1st and 99th percentiles.
+        k_lo, k_hi = _percentile_ranks(flat.size)
+        part = np.partition(flat, [k_lo, k_hi])
+        lo = float(part[k_lo])
+        hi = float(part[k_hi])
         if not np.isfinite(lo) or not np.isfinite(hi) or hi <= lo:
             raise ValueError
         return lo, hi
     except Exception:
-        lo = float(np.min(arr))
-        hi = float(np.max(arr))
+        lo = float(np.min(flat))
+        hi = float(np.max(flat))
         if hi <= lo:
             hi = lo + 1.0
         return lo, hi
 
 
-def dataset_to_image(ds: FileDataset) -> Optional[Image.Image]:
-    """Return a RGB PIL.Image from the dataset or None if not possible."""
+def _window_to_u8(array: np.ndarray, lo: float, hi: float) -> np.ndarray:
+    """Scale ``array`` into 0..255 over the ``[lo, hi]`` window.
 
-    if not hasattr(ds, "pixel_array"):
+    Rows are processed in blocks through a small float32 scratch buffer that
+    stays in cache, instead of allocating a float copy of the whole frame.
+    """
+    out = np.empty(array.shape, dtype=np.uint8)
+    if array.size == 0:
+        return out
+    rows = max(1, WINDOW_BLOCK_PIXELS * array.shape[0] // array.size)
+    scratch = np.empty((min(rows, array.shape[0]),) + array.shape[1:], dtype=np.float32)
+    scale = np.float32(255.0 / (hi - lo))
+    for start in range(0, array.shape[0], rows):
+        src = array[start : start + rows]
+        buf = scratch[: src.shape[0]]
+        np.subtract(src, lo, out=buf, dtype=np.float32)
+        np.multiply(buf, scale, out=buf)
+        np.clip(buf, 0.0, 255.0, out=buf)
+        out[start : start + rows] = buf
+    return out
+
+
+_NATIVE_LE_SYNTAXES = {ExplicitVRLittleEndian, ImplicitVRLittleEndian}
+
+
+def _native_pixel_array(ds: FileDataset) -> Optional[np.ndarray]:
+    """Zero-copy view of uncompressed little-endian, single-frame grayscale data.
+
+    Returns None whenever pydicom's generic ``pixel_array`` decoding is needed.
+    """
+
+    try:
+        if ds.file_meta.TransferSyntaxUID not in _NATIVE_LE_SYNTAXES:
+            return None
+        bits = int(ds.BitsAllocated)
+        signed = int(getattr(ds, "PixelRepresentation", 0)) == 1
+        if bits not in (8, 16) or int(getattr(ds, "SamplesPerPixel", 1)) != 1:
+            return None
+        if int(getattr(ds, "NumberOfFrames", 1) or 1) != 1:
+            return None
+        if signed and int(getattr(ds, "BitsStored", bits)) != bits:
+            return None
+        rows, cols = int(ds.Rows), int(ds.Columns)
+        dtype = np.dtype(f"<{'i' if signed else 'u'}{bits // 8}")
+        data = ds.PixelData
+        if len(data) < rows * cols * dtype.itemsize:
+            return None
+        return np.frombuffer(data, dtype=dtype, count=rows * cols).reshape(rows, cols)
+    except Exception:
+        return None
+
+
+def _first_value(value):
+    return value[0] if isinstance(value, MultiValue) else value
+
+
+def _voi_window(ds: FileDataset) -> Optional[Tuple[float, float]]:
+    """Linear VOI window mapped back to stored pixel values.
+
+    Folding Rescale Slope/Intercept into the bounds lets ``_window_to_u8`` apply
+    the modality and VOI transforms in its single pass. A negative slope yields
+    ``lo > hi``, which ``_window_to_u8`` maps correctly. Returns None when the
+    dataset has no linear window or uses a Modality LUT Sequence.
+    """
+
+    if "WindowCenter" not in ds or "WindowWidth" not in ds or "ModalityLUTSequence" in ds:
+        return None
+    if str(getattr(ds, "VOILUTFunction", "") or "LINEAR").upper() != "LINEAR":
         return None
     try:
-        array = ds.pixel_array
-    except Exception as exc:  # pragma: no cover - relies on native handlers
-        LOGGER.warning("pixel_array unavailable: %s", exc)
+        center = float(_first_value(ds.WindowCenter))
+        width = float(_first_value(ds.WindowWidth))
+        slope = float(getattr(ds, "RescaleSlope", 1) or 1)
+        intercept = float(getattr(ds, "RescaleIntercept", 0) or 0)
+    except (TypeError, ValueError, IndexError):
         return None
+    if width <= 1 or not np.isfinite(center) or not np.isfinite(width):
+        return None
+    lo = (center - 0.5 - (width - 1) / 2 - intercept) / slope
+    hi = (center - 0.5 + (width - 1) / 2 - intercept) / slope
+    return lo, hi
+
+
+def _grayscale_to_u8(ds: FileDataset, array: np.ndarray) -> np.ndarray:
+    window = _voi_window(ds)
+    if window is None:
+        if "VOILUTSequence" in ds or "WindowCenter" in ds:
+            try:
+                array = apply_voi_lut(apply_modality_lut(array, ds), ds)
+            except Exception as exc:
+                LOGGER.warning("VOI LUT not applied: %s", exc)
+        window = _percentile_window(array)
+    pixels = _window_to_u8(array, *window)
+    if getattr(ds, "PhotometricInterpretation", "MONOCHROME2").upper() == "MONOCHROME1":
+        np.bitwise_xor(pixels, 0xFF, out=pixels)
+    return pixels
+
+
+def dataset_to_image(ds: FileDataset) -> Optional[Image.Image]:
+    """Return a PIL.Image (8-bit ``L`` or ``RGB``) from the dataset or None if not possible."""
+
+    array = _native_pixel_array(ds)
+    if array is None:
+        if not hasattr(ds, "pixel_array"):
+            return None
+        try:
+            array = ds.pixel_array
+        except Exception as exc:  # pragma: no cover - relies on native handlers
+            LOGGER.warning("pixel_array unavailable: %s", exc)
+            return None
 
     if array.ndim == 2:
-        lo, hi = _percentile_window(array.astype(np.float32))
-        scaled = np.clip((array - lo) / (hi - lo), 0, 1) * 255.0
-        img = Image.fromarray(scaled.astype(np.uint8), mode="L")
-        if getattr(ds, "PhotometricInterpretation", "MONOCHROME2").upper() == "MONOCHROME1":
-            img = Image.fromarray(255 - np.array(img), mode="L")
-        return img.convert("RGB")
+        return Image.fromarray(_grayscale_to_u8(ds, array), mode="L")
 
     if array.ndim == 3:
         if array.shape[-1] == 3:
-            return Image.fromarray(array.astype(np.uint8), mode="RGB")
+            # No copy when the frame is already C-contiguous uint8.
+            return Image.fromarray(np.ascontiguousarray(array, dtype=np.uint8), mode="RGB")
         if array.shape[0] == 3:
-            return Image.fromarray(np.moveaxis(array, 0, -1).astype(np.uint8), mode="RGB")
-        lo, hi = _percentile_window(array[..., 0].astype(np.float32))
-        scaled = np.clip((array[..., 0] - lo) / (hi - lo), 0, 1) * 255.0
-        return Image.fromarray(scaled.astype(np.uint8), mode="L").convert("RGB")
+            rgb = np.ascontiguousarray(array.transpose(1, 2, 0), dtype=np.uint8)
+            return Image.fromarray(rgb, mode="RGB")
+        return Image.fromarray(_grayscale_to_u8(ds, array[..., 0]), mode="L")
 
     return None
 
@@ -154,29 +338,196 @@ def _safe_instance_number(ds: FileDataset) -> int:
         return 999999
 
 
-def _unique_preview_path(previews_dir: Path, instance_number: int) -> Path:
-    previews_dir.mkdir(parents=True, exist_ok=True)
-    index = 1
-    while True:
-        candidate = previews_dir / f"i{instance_number:05d}_{index:04d}.png"
-        if not candidate.exists():
+def _tmp_sibling(target: Path) -> Path:
+    """Per-thread temporary name next to ``target`` for write-then-rename."""
+
+    return target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+_PREVIEW_INDEX_LOCK = threading.Lock()
+_PREVIEW_INDEX: Dict[Tuple[Path, int], int] = {}
+_PREVIEW_INDEX_MAX = 4096
+
+
+def _publish_preview(tmp: Path, previews_dir: Path, instance_number: int) -> Path:
+    """Link the finished ``tmp`` JPEG under the next free ``iNNNNN_NNNN.jpg`` name.
+
+    The last index handed out is remembered so series where many instances share
+    an InstanceNumber do not re-probe every earlier name. ``os.link`` refuses an
+    existing name, which keeps publishing safe against other threads and
+    processes, and ``previews/`` only ever holds complete files.
+    """
+
+    key = (previews_dir, instance_number)
+    with _PREVIEW_INDEX_LOCK:
+        if len(_PREVIEW_INDEX) >= _PREVIEW_INDEX_MAX:
+            _PREVIEW_INDEX.clear()
+        index = _PREVIEW_INDEX.get(key, 0)
+        while True:
+            index += 1
+            candidate = previews_dir / f"i{instance_number:05d}_{index:04d}.jpg"
+            try:
+                os.link(tmp, candidate)
+            except FileExistsError:
+                continue
+            _PREVIEW_INDEX[key] = index
             return candidate
-        index += 1
+
+
+_PREVIEW_COUNT_LOCK = threading.Lock()
+_PREVIEW_COUNT: Dict[Path, int] = {}
+_PREVIEW_SEEN: Dict[Path, int] = {}
+_PREVIEW_INFLIGHT: Dict[Path, int] = {}
+
+
+def _previews_mtime(series_dir: Path) -> int:
+    try:
+        return (series_dir / "previews").stat().st_mtime_ns
+    except OSError:
+        return -1
+
+
+def _take_preview_slot(series_dir: Path, count: int) -> None:
+    _PREVIEW_COUNT[series_dir] = count + 1
+    _PREVIEW_INFLIGHT[series_dir] = _PREVIEW_INFLIGHT.get(series_dir, 0) + 1
+
+
+def _reserve_preview_slot(series_dir: Path) -> bool:
+    """Take one of the ``MAX_PREVIEWS_PER_SERIES`` preview slots of ``series_dir``.
+
+    Below the cap this is a dict update. The count is seeded from disk the first
+    time a series is seen; at the cap it is only recounted when ``previews/``
+    changed since the last count (e.g. the series was deleted and sent again),
+    so refusing costs a single stat. Listing happens outside the lock, and slots
+    still being encoded count towards the cap.
+    """
+
+    if MAX_PREVIEWS_PER_SERIES <= 0:
+        return True
+    with _PREVIEW_COUNT_LOCK:
+        count = _PREVIEW_COUNT.get(series_dir)
+        if count is not None and count < MAX_PREVIEWS_PER_SERIES:
+            _take_preview_slot(series_dir, count)
+            return True
+        seen = _PREVIEW_SEEN.get(series_dir)
+    mtime = _previews_mtime(series_dir)
+    if count is not None and mtime == seen:
+        return False
+    on_disk = len(_series_preview_files(series_dir))
+    with _PREVIEW_COUNT_LOCK:
+        _PREVIEW_SEEN[series_dir] = mtime
+        count = on_disk + _PREVIEW_INFLIGHT.get(series_dir, 0)
+        if count >= MAX_PREVIEWS_PER_SERIES:
+            _PREVIEW_COUNT[series_dir] = count
+            return False
+        _take_preview_slot(series_dir, count)
+        return True
+
+
+def _finish_preview_slot(series_dir: Path, saved: bool) -> None:
+    """Close a reservation; a slot whose preview was not saved is handed back."""
+
+    if MAX_PREVIEWS_PER_SERIES <= 0:
+        return
+    with _PREVIEW_COUNT_LOCK:
+        inflight = _PREVIEW_INFLIGHT.get(series_dir, 0) - 1
+        if inflight > 0:
+            _PREVIEW_INFLIGHT[series_dir] = inflight
+        else:
+            _PREVIEW_INFLIGHT.pop(series_dir, None)
+        if not saved and _PREVIEW_COUNT.get(series_dir):
+            _PREVIEW_COUNT[series_dir] -= 1
 
 
 def save_preview_image(ds: FileDataset, series_dir: Path) -> Optional[Path]:
+    if not _reserve_preview_slot(series_dir):
+        return None
+    saved = None
+    try:
+        saved = _encode_preview(ds, series_dir)
+        return saved
+    finally:
+        _finish_preview_slot(series_dir, saved is not None)
+
+
+def _encode_preview(ds: FileDataset, series_dir: Path) -> Optional[Path]:
     image = dataset_to_image(ds)
     if image is None:
         return None
     previews_dir = series_dir / "previews"
-    outfile = _unique_preview_path(previews_dir, _safe_instance_number(ds))
-    outfile.parent.mkdir(parents=True, exist_ok=True)
+    previews_dir.mkdir(parents=True, exist_ok=True)
+    instance_number = _safe_instance_number(ds)
+    # Encoded under a .tmp name that preview listings skip, then linked into place.
+    tmp = _tmp_sibling(previews_dir / f"i{instance_number:05d}")
     try:
-        image.save(outfile, format="PNG", optimize=True)
-        return outfile
+        image.save(tmp, format="JPEG", quality=85)
+        return _publish_preview(tmp, previews_dir, instance_number)
     except Exception as exc:
         LOGGER.warning("failed to save preview: %s", exc)
         return None
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg_size(image_path: Path) -> Optional[Tuple[int, int]]:
+    """Read ``(width, height)`` from the JPEG frame header without opening PIL."""
+
+    try:
+        with open(image_path, "rb") as fh:
+            if fh.read(2) != b"\xff\xd8":
+                return None
+            while True:
+                marker = fh.read(2)
+                if len(marker) != 2 or marker[0] != 0xFF:
+                    return None
+                (length,) = struct.unpack(">H", fh.read(2))
+                if marker[1] in _JPEG_SOF_MARKERS:
+                    height, width = struct.unpack(">xHH", fh.read(5))
+                    return width, height
+                fh.seek(length - 2, os.SEEK_CUR)
+    except (OSError, struct.error):
+        return None
+
+
+@functools.lru_cache(maxsize=512)
+def _downscaled_jpeg(path: str, mtime_ns: int, max_size: Tuple[int, int]) -> Tuple[bytes, int, int]:
+    """JPEG bytes of ``path`` shrunk to ``max_size``; cached so study sheets reuse series work."""
+
+    with Image.open(path) as image:
+        image.draft("RGB", max_size)
+        if image.mode not in ("L", "RGB"):
+            image = image.convert("RGB")
+        image.thumbnail(max_size, Image.LANCZOS)
+        buf = io.BytesIO()
+        image.save(buf, format="JPEG", quality=85)
+        return buf.getvalue(), image.size[0], image.size[1]
+
+
+def _load_contact_image(image_path: Path, max_size: Tuple[int, int]) -> Optional[Tuple[object, int, int]]:
+    """Return ``(source, width, height)`` ready for ``canvas.drawImage``.
+
+    JPEG previews that already fit ``max_size`` are passed by path so ReportLab
+    embeds them as-is; anything else is downscaled and re-encoded once.
+    """
+
+    size = _jpeg_size(image_path) if image_path.suffix.lower() in JPEG_SUFFIXES else None
+    if size and size[0] <= max_size[0] and size[1] <= max_size[1]:
+        return str(image_path), size[0], size[1]
+    try:
+        if size is None:
+            # Header unknown (PNG or unparsed JPEG): let PIL tell whether it fits.
+            with Image.open(image_path) as image:
+                iw, ih = image.size
+                if image.format == "JPEG" and iw <= max_size[0] and ih <= max_size[1]:
+                    return str(image_path), iw, ih
+        data, width, height = _downscaled_jpeg(str(image_path), image_path.stat().st_mtime_ns, max_size)
+        return ImageReader(io.BytesIO(data)), width, height
+    except Exception as exc:  # pragma: no cover - depends on PIL
+        LOGGER.warning("could not load preview for PDF: %s", exc)
+        return None
 
 
 def _draw_contact_sheet(
@@ -190,15 +541,35 @@ def _draw_contact_sheet(
     margin = 36.0
     header_height = 20 if header else 0
 
-    c = canvas.Canvas(str(destination), pagesize=A4)
+    # Drawn next to the destination and renamed over it once complete, so a
+    # reader never gets a half-written sheet.
+    tmp = _tmp_sibling(destination)
+    c = canvas.Canvas(str(tmp), pagesize=A4)
     c.setTitle("Contact Sheet")
 
     usable_height = PAGE_H - (rows + 1) * margin - header_height
     cell_w = (PAGE_W - (cols + 1) * margin) / cols
     cell_h = usable_height / rows
+    # Previews larger than the cell at 300 DPI are downscaled before embedding.
+    max_size = (int(cell_w * 300 / 72), int(cell_h * 300 / 72))
+
+    per_page = cols * rows
+    slots = [
+        (
+            margin + (k % cols) * (cell_w + margin),
+            margin + (rows - 1 - k // cols) * (cell_h + margin) + header_height,
+        )
+        for k in range(per_page)
+    ]
+    max_w, max_h = cell_w, cell_h - 16
 
-    for idx, image_path in enumerate(image_paths):
-        if idx % (cols * rows) == 0:
+    workers = min(len(image_paths), os.cpu_count() or 1) or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        loaded_images = list(pool.map(lambda p: _load_contact_image(p, max_size), image_paths))
+
+    for idx, (image_path, loaded) in enumerate(zip(image_paths, loaded_images)):
+        pos = idx % per_page
+        if pos == 0:
             if idx:
                 c.showPage()
             if header:
@@ -208,40 +579,37 @@ def _draw_contact_sheet(
                 c.setFont("Helvetica", 9)
                 c.drawString(margin, PAGE_H - margin - header_height - 8, subtitle)
 
-        pos = idx % (cols * rows)
-        row = rows - 1 - pos // cols
-        col = pos % cols
-        x = margin + col * (cell_w + margin)
-        y = margin + row * (cell_h + margin) + header_height
-        try:
-            with Image.open(image_path) as image:
-                image = image.convert("RGB")
-                buf = io.BytesIO()
-                image.save(buf, format="JPEG", quality=85, optimize=True)
-                buf.seek(0)
-                reader = ImageReader(buf)
-                iw, ih = image.size
-        except Exception as exc:  # pragma: no cover - depends on PIL
-            LOGGER.warning("could not load preview for PDF: %s", exc)
+        if loaded is None:
             continue
+        x, y = slots[pos]
+        source, iw, ih = loaded
 
-        scale = min(cell_w / iw, (cell_h - 16) / ih)
+        scale = min(max_w / iw, max_h / ih)
         draw_w = iw * scale
         draw_h = ih * scale
-        dx = x + (cell_w - draw_w) / 2
-        dy = y + (cell_h - 16 - draw_h) / 2 + 8
-        c.drawImage(reader, dx, dy, width=draw_w, height=draw_h)
+        dx = x + (max_w - draw_w) / 2
+        dy = y + (max_h - draw_h) / 2 + 8
+        c.drawImage(source, dx, dy, width=draw_w, height=draw_h)
         c.setFont("Helvetica", 8)
         c.drawCentredString(x + cell_w / 2, y + 2, image_path.stem)
 
     c.showPage()
-    c.save()
+    _save_canvas(c, tmp, destination)
+
+
+def _save_canvas(c: canvas.Canvas, tmp: Path, destination: Path) -> None:
+    try:
+        c.save()
+        os.replace(tmp, destination)
+    finally:
+        tmp.unlink(missing_ok=True)
 
 
 def _draw_diagnostic_pdf(destination: Path, header: str, lines: Sequence[str]) -> None:
     PAGE_W, PAGE_H = A4
     margin = 36.0
-    c = canvas.Canvas(str(destination), pagesize=A4)
+    tmp = _tmp_sibling(destination)
+    c = canvas.Canvas(str(tmp), pagesize=A4)
     if header:
         c.setFont("Helvetica", 11)
         c.drawCentredString(PAGE_W / 2, PAGE_H - margin / 2 - 6, header)
@@ -257,18 +625,49 @@ def _draw_diagnostic_pdf(destination: Path, header: str, lines: Sequence[str]) -
             y = PAGE_H - margin
     if y == PAGE_H - margin:
         c.showPage()
-    c.save()
+    _save_canvas(c, tmp, destination)
+
+
+def _subdirs(path: Path) -> List[Path]:
+    """Sorted child directories of ``path`` using scandir's cached d_type."""
+
+    with os.scandir(path) as entries:
+        names = [entry.name for entry in entries if entry.is_dir()]
+    return [path / name for name in sorted(names)]
 
 
 def _series_preview_files(series_dir: Path) -> List[Path]:
+    # Preview names are zero-padded (iNNNNN_NNNN.jpg), so sorting the plain name
+    # strings gives instance order without building Path objects first.
     previews_dir = series_dir / "previews"
-    if previews_dir.is_dir():
-        return sorted(previews_dir.glob("*.png"))
-    return []
+    try:
+        with os.scandir(previews_dir) as entries:
+            names = [entry.name for entry in entries if os.path.splitext(entry.name)[1].lower() in PREVIEW_SUFFIXES]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    return [previews_dir / name for name in sorted(names)]
 
 
 def _collect_dicom_files(series_dir: Path) -> List[Path]:
-    return sorted(p for p in series_dir.glob("*.dcm"))
+    with os.scandir(series_dir) as entries:
+        names = [entry.name for entry in entries if entry.name.endswith(".dcm")]
+    return [series_dir / name for name in sorted(names)]
+
+
+def _preview_from_file(path: Path, series_dir: Path) -> Tuple[Optional[Path], Optional[str]]:
+    try:
+        ds = dcmread(str(path), force=True)
+    except Exception as exc:
+        return None, f"Falha ao ler {path.name}: {exc}"
+    if not hasattr(ds, "PixelData"):
+        return None, f"{path.name} não possui PixelData"
+    return save_preview_image(ds, series_dir), None
+
+
+# Decoding, windowing and JPEG encoding release the GIL, so one shared thread
+# pool scales preview work across cores. Processes are not an option: importing
+# this module starts the DICOM listener.
+_PREVIEW_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="preview")
 
 
 def ensure_previews_for_series(series_dir: Path, limit: Optional[int] = None) -> Tuple[List[Path], List[str]]:
@@ -282,69 +681,247 @@ def ensure_previews_for_series(series_dir: Path, limit: Optional[int] = None) ->
     if not dicoms:
         return previews, errors
 
-    for path in dicoms:
-        if limit is not None and len(previews) >= limit:
+    # With a limit, files are decoded in batches of the missing count so large
+    # series are not decoded past what the PDF needs.
+    remaining = iter(dicoms)
+    while limit is None or len(previews) < limit:
+        batch = list(itertools.islice(remaining, None if limit is None else limit - len(previews)))
+        if not batch:
             break
-        try:
-            ds = dcmread(str(path), force=True)
-        except Exception as exc:
-            errors.append(f"Falha ao ler {path.name}: {exc}")
-            continue
-        if not hasattr(ds, "PixelData"):
-            errors.append(f"{path.name} não possui PixelData")
-            continue
-        saved = save_preview_image(ds, series_dir)
-        if saved is not None:
-            previews.append(saved)
+        for saved, error in _PREVIEW_POOL.map(lambda path: _preview_from_file(path, series_dir), batch):
+            if error:
+                errors.append(error)
+            elif saved is not None:
+                previews.append(saved)
     return sorted(previews), errors
 
 
+# Series and study PDFs (with their .pdf_state) and the study manifest are
+# rebuilt from post-store jobs and HTTP requests alike; one lock per directory
+# keeps those writers from interleaving. Entries live only while in use.
+_DIR_LOCKS_GUARD = threading.Lock()
+_DIR_LOCKS: Dict[Path, List] = {}
+
+
+@contextlib.contextmanager
+def _dir_lock(path: Path) -> Iterator[None]:
+    with _DIR_LOCKS_GUARD:
+        entry = _DIR_LOCKS.setdefault(path, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _DIR_LOCKS_GUARD:
+            entry[1] -= 1
+            if not entry[1]:
+                del _DIR_LOCKS[path]
+
+
+PDF_STATE_NAME = ".pdf_state"
+
+
+def _pdf_state(pdf_path: Path, previews: Sequence[Path]) -> dict:
+    """Fingerprint of the previews behind ``pdf_path``: relative name, mtime and size.
+
+    A preview that changed after the PDF was drawn has a different size/mtime,
+    so the next build re-renders instead of keeping a stale sheet.
+    """
+
+    entries = []
+    for preview in sorted(previews):
+        try:
+            st = preview.stat()
+            entries.append([preview.relative_to(pdf_path.parent).as_posix(), st.st_mtime_ns, st.st_size])
+        except (OSError, ValueError):
+            entries.append([str(preview), -1, -1])
+    return {"previews": entries, "layout": [PDF_COLS, PDF_ROWS, PDF_HEADER]}
+
+
+def _pdf_is_current(pdf_path: Path, state: dict) -> bool:
+    """True when ``pdf_path`` was already rendered from the previews in ``state``."""
+
+    if not pdf_path.exists():
+        return False
+    try:
+        saved = json.loads((pdf_path.parent / PDF_STATE_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    return saved == state
+
+
+def _save_pdf_state(pdf_path: Path, state: dict) -> None:
+    try:
+        (pdf_path.parent / PDF_STATE_NAME).write_text(json.dumps(state), encoding="utf-8")
+    except OSError as exc:
+        LOGGER.warning("could not write PDF state for %s: %s", pdf_path, exc)
+
+
 def generate_series_pdf(series_dir: Path, *, allow_preview_generation: bool = True) -> Path:
+    with _dir_lock(series_dir):
+        return _generate_series_pdf(series_dir, allow_preview_generation)
+
+
+def _generate_series_pdf(series_dir: Path, allow_preview_generation: bool) -> Path:
     pdf_path = series_dir / "SeriesContactSheet.pdf"
-    previews, errors = ensure_previews_for_series(
-        series_dir,
-        limit=PDF_COLS * PDF_ROWS if allow_preview_generation else None,
-    )
+    if allow_preview_generation:
+        previews, errors = ensure_previews_for_series(series_dir, limit=PDF_COLS * PDF_ROWS)
+    else:
+        previews, errors = _series_preview_files(series_dir), []
     if previews:
+        state = _pdf_state(pdf_path, previews)
+        if _pdf_is_current(pdf_path, state):
+            return pdf_path
         subtitle = f"Série: {series_dir.name}"
         _draw_contact_sheet(previews, pdf_path, PDF_HEADER, subtitle=subtitle)
+        _save_pdf_state(pdf_path, state)
     else:
         if allow_preview_generation:
             errors.append("Nenhum preview disponível para esta série.")
         _draw_diagnostic_pdf(pdf_path, PDF_HEADER, errors)
+        (pdf_path.parent / PDF_STATE_NAME).unlink(missing_ok=True)
     return pdf_path
 
 
 def generate_study_pdf(study_dir: Path, *, allow_preview_generation: bool = True) -> Path:
+    with _dir_lock(study_dir):
+        return _generate_study_pdf(study_dir, allow_preview_generation)
+
+
+def _generate_study_pdf(study_dir: Path, allow_preview_generation: bool) -> Path:
     pdf_path = study_dir / "StudyContactSheet.pdf"
     all_previews: List[Path] = []
     errors: List[str] = []
-    for series_dir in sorted(p for p in study_dir.iterdir() if p.is_dir()):
-        previews, p_errors = ensure_previews_for_series(series_dir, limit=1 if allow_preview_generation else None)
+    for series_dir in _subdirs(study_dir):
+        if allow_preview_generation:
+            previews, p_errors = ensure_previews_for_series(series_dir, limit=1)
+            errors.extend(p_errors)
+        else:
+            previews = _series_preview_files(series_dir)
         all_previews.extend(previews)
-        errors.extend(p_errors)
     if all_previews:
+        state = _pdf_state(pdf_path, all_previews)
+        if _pdf_is_current(pdf_path, state):
+            return pdf_path
         _draw_contact_sheet(all_previews, pdf_path, PDF_HEADER)
+        _save_pdf_state(pdf_path, state)
     else:
         if allow_preview_generation:
             errors.append("Nenhuma miniatura foi criada para o estudo.")
         _draw_diagnostic_pdf(pdf_path, PDF_HEADER, errors)
+        (pdf_path.parent / PDF_STATE_NAME).unlink(missing_ok=True)
     return pdf_path
 
 
 def _iter_day_dirs() -> Iterable[Path]:
-    for year_dir in sorted(STORE_DIR.iterdir()):
-        if not year_dir.is_dir() or not year_dir.name.isdigit():
+    for year_dir in _subdirs(STORE_DIR):
+        if not year_dir.name.isdigit():
             continue
-        for month_dir in sorted(year_dir.iterdir()):
-            if not month_dir.is_dir() or not month_dir.name.isdigit():
+        for month_dir in _subdirs(year_dir):
+            if not month_dir.name.isdigit():
                 continue
-            for day_dir in sorted(month_dir.iterdir()):
-                if day_dir.is_dir() and day_dir.name.isdigit():
+            for day_dir in _subdirs(month_dir):
+                if day_dir.name.isdigit():
                     yield day_dir
 
 
-def find_study_dir(study_uid: str) -> Optional[Path]:
+# Index StudyUID/SeriesUID -> directory to avoid walking STORE_DIR per request.
+_INDEX_LOCK = threading.RLock()
+_INDEX_BUILD_LOCK = threading.Lock()
+_STUDY_INDEX: Dict[str, Path] = {}
+_SERIES_INDEX: Dict[str, Path] = {}
+_INDEX_MTIMES: Dict[Path, int] = {}
+_INDEX_BUILT_AT: Optional[float] = None
+
+
+def _mtime_ns(path: Path) -> int:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return -1
+
+
+def _index_put(index: Dict[str, Path], uid: str, path: Path) -> None:
+    current = index.get(uid)
+    mtime = _mtime_ns(path)
+    if current is not None and current != path and _INDEX_MTIMES.get(current, -1) > mtime:
+        return
+    index[uid] = path
+    _INDEX_MTIMES[path] = mtime
+
+
+def _build_index() -> None:
+    global _INDEX_BUILT_AT
+    studies: Dict[str, Path] = {}
+    series: Dict[str, Path] = {}
+    mtimes: Dict[Path, int] = {}
+    root_depth = len(STORE_DIR.parts)
+    for cur, dirs, _files in os.walk(STORE_DIR, topdown=True):
+        depth = len(Path(cur).parts) - root_depth
+        if depth < 3:
+            dirs[:] = sorted(d for d in dirs if d.isdigit())
+            continue
+        for name in dirs:
+            path = Path(cur) / name
+            mtime = _mtime_ns(path)
+            target = studies if depth == 3 else series
+            current = target.get(name)
+            if current is None or mtimes[current] <= mtime:
+                target[name] = path
+                mtimes[path] = mtime
+        if depth == 4:
+            dirs[:] = []
+    with _INDEX_LOCK:
+        _STUDY_INDEX.clear()
+        _STUDY_INDEX.update(studies)
+        _SERIES_INDEX.clear()
+        _SERIES_INDEX.update(series)
+        _INDEX_MTIMES.clear()
+        _INDEX_MTIMES.update(mtimes)
+        _INDEX_BUILT_AT = time.monotonic()
+
+
+def _index_stale() -> bool:
+    with _INDEX_LOCK:
+        return _INDEX_BUILT_AT is None or time.monotonic() - _INDEX_BUILT_AT > INDEX_TTL
+
+
+def _refresh_index() -> None:
+    """Rebuild a stale index without holding ``_INDEX_LOCK`` during the walk.
+
+    Only one thread walks STORE_DIR; once an index exists, other callers keep
+    using it instead of waiting for the rebuild.
+    """
+
+    if not _index_stale():
+        return
+    with _INDEX_LOCK:
+        first_build = _INDEX_BUILT_AT is None
+    if not _INDEX_BUILD_LOCK.acquire(blocking=first_build):
+        return
+    try:
+        if _index_stale():
+            _build_index()
+    finally:
+        _INDEX_BUILD_LOCK.release()
+
+
+def _index_lookup(index: Dict[str, Path], uid: str) -> Optional[Path]:
+    _refresh_index()
+    with _INDEX_LOCK:
+        path = index.get(uid)
+    if path is not None and path.is_dir():
+        return path
+    return None
+
+
+def index_stored_series(series_dir: Path) -> None:
+    with _INDEX_LOCK:
+        _index_put(_STUDY_INDEX, series_dir.parent.name, series_dir.parent)
+        _index_put(_SERIES_INDEX, series_dir.name, series_dir)
+
+
+def _scan_study_dir(study_uid: str) -> Optional[Path]:
     matches: List[Path] = []
     for day_dir in _iter_day_dirs():
         candidate = day_dir / study_uid
@@ -355,12 +932,10 @@ def find_study_dir(study_uid: str) -> Optional[Path]:
     return max(matches, key=lambda p: p.stat().st_mtime)
 
 
-def find_series_dir(series_uid: str) -> Optional[Path]:
+def _scan_series_dir(series_uid: str) -> Optional[Path]:
     matches: List[Path] = []
     for day_dir in _iter_day_dirs():
-        for study_dir in day_dir.iterdir():
-            if not study_dir.is_dir():
-                continue
+        for study_dir in _subdirs(day_dir):
             candidate = study_dir / series_uid
             if candidate.is_dir():
                 matches.append(candidate)
@@ -369,6 +944,28 @@ def find_series_dir(series_uid: str) -> Optional[Path]:
     return max(matches, key=lambda p: p.stat().st_mtime)
 
 
+def find_study_dir(study_uid: str) -> Optional[Path]:
+    found = _index_lookup(_STUDY_INDEX, study_uid)
+    if found is not None:
+        return found
+    found = _scan_study_dir(study_uid)
+    if found is not None:
+        with _INDEX_LOCK:
+            _index_put(_STUDY_INDEX, study_uid, found)
+    return found
+
+
+def find_series_dir(series_uid: str) -> Optional[Path]:
+    found = _index_lookup(_SERIES_INDEX, series_uid)
+    if found is not None:
+        return found
+    found = _scan_series_dir(series_uid)
+    if found is not None:
+        with _INDEX_LOCK:
+            _index_put(_SERIES_INDEX, series_uid, found)
+    return found
+
+
 def _pick_date_parts(ds: FileDataset) -> Tuple[str, str, str]:
     candidates = [
         getattr(ds, "StudyDate", ""),
@@ -380,22 +977,41 @@ def _pick_date_parts(ds: FileDataset) -> Tuple[str, str, str]:
         value = str(value)
         if len(value) >= 8 and value[:8].isdigit():
             return value[:4], value[4:6], value[6:8]
-    now = datetime.now()
-    return now.strftime("%Y"), now.strftime("%m"), now.strftime("%d")
+    return _today_parts()
 
 
-def _study_metadata_from_series(series_dir: Path) -> dict:
+_TODAY_LOCK = threading.Lock()
+_TODAY: Tuple[float, Tuple[str, str, str]] = (0.0, ("", "", ""))
+
+
+def _today_parts() -> Tuple[str, str, str]:
+    """Local ``(YYYY, MM, DD)``, recomputed only once the next local midnight passes."""
+
+    global _TODAY
+    valid_until, parts = _TODAY
+    if time.time() < valid_until:
+        return parts
+    with _TODAY_LOCK:
+        now = datetime.now()
+        parts = (f"{now.year:04d}", f"{now.month:02d}", f"{now.day:02d}")
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        _TODAY = (midnight.timestamp(), parts)
+    return parts
+
+
+_METADATA_TAGS = ["PatientName", "PatientID", "StudyDescription", "StudyDate", "SeriesDate"]
+
+
+@functools.lru_cache(maxsize=4096)
+def _read_header_metadata(path: str, mtime_ns: int, size: int) -> dict:
     metadata = {
         "patient_name": None,
         "patient_id": None,
         "study_desc": None,
         "study_date": None,
     }
-    dicoms = _collect_dicom_files(series_dir)
-    if not dicoms:
-        return metadata
     try:
-        ds = dcmread(str(dicoms[0]), stop_before_pixels=True, force=True)
+        ds = dcmread(path, stop_before_pixels=True, force=True, specific_tags=_METADATA_TAGS)
     except Exception:
         return metadata
     metadata["patient_name"] = str(getattr(ds, "PatientName", "") or "") or None
@@ -407,14 +1023,34 @@ def _study_metadata_from_series(series_dir: Path) -> dict:
     return metadata
 
 
-def collect_study_metadata(study_dir: Path) -> dict:
+def _study_metadata_from_series(series_dir: Path) -> dict:
+    metadata = {
+        "patient_name": None,
+        "patient_id": None,
+        "study_desc": None,
+        "study_date": None,
+    }
+    dicoms = _collect_dicom_files(series_dir)
+    if not dicoms:
+        return metadata
+    try:
+        st = dicoms[0].stat()
+    except OSError:
+        return metadata
+    metadata.update(_read_header_metadata(str(dicoms[0]), st.st_mtime_ns, st.st_size))
+    return metadata
+
+
+def collect_study_metadata(study_dir: Path, series_dirs: Optional[Sequence[Path]] = None) -> dict:
     metadata = {
         "patient_name": None,
         "patient_id": None,
         "study_desc": None,
         "study_date": None,
     }
-    for series_dir in sorted(p for p in study_dir.iterdir() if p.is_dir()):
+    if series_dirs is None:
+        series_dirs = _subdirs(study_dir)
+    for series_dir in series_dirs:
         series_meta = _study_metadata_from_series(series_dir)
         for key, value in series_meta.items():
             if value and not metadata.get(key):
@@ -424,12 +1060,63 @@ def collect_study_metadata(study_dir: Path) -> dict:
     return metadata
 
 
+def _build_study_manifest(study_dir: Path) -> dict:
+    series_dirs = _subdirs(study_dir)
+    manifest = collect_study_metadata(study_dir, series_dirs)
+    series = []
+    for series_dir in series_dirs:
+        previews = _series_preview_files(series_dir)
+        series.append(
+            {
+                "uid": series_dir.name,
+                "preview_count": len(previews),
+                "first_preview": previews[0].name if previews else None,
+                "pdf_ready": (series_dir / "SeriesContactSheet.pdf").exists(),
+            }
+        )
+    manifest["series"] = series
+    manifest["study_pdf"] = (study_dir / "StudyContactSheet.pdf").exists()
+    return manifest
+
+
+def write_study_manifest(study_dir: Path) -> dict:
+    target = study_dir / STUDY_MANIFEST
+    tmp = _tmp_sibling(target)
+    # Under the study lock so an older snapshot never replaces a newer one.
+    with _dir_lock(study_dir):
+        manifest = _build_study_manifest(study_dir)
+        try:
+            tmp.write_text(json.dumps(manifest), encoding="utf-8")
+            os.replace(tmp, target)
+        except OSError as exc:
+            LOGGER.warning("could not write study manifest %s: %s", target, exc)
+    return manifest
+
+
+@functools.lru_cache(maxsize=1024)
+def _read_study_manifest(path: str, mtime_ns: int) -> dict:
+    return json.loads(Path(path).read_bytes())
+
+
+def load_study_manifest(study_dir: Path) -> dict:
+    """Return the cached study manifest, building it when missing or unreadable.
+
+    The returned dict is shared between requests and must not be mutated.
+    """
+
+    path = study_dir / STUDY_MANIFEST
+    try:
+        return _read_study_manifest(str(path), path.stat().st_mtime_ns)
+    except (OSError, ValueError):
+        return write_study_manifest(study_dir)
+
+
 def iter_recent_day_dirs(days: int) -> Iterable[Path]:
-    now = datetime.now()
+    today = datetime.now().date()
     for i in range(days):
-        dt = now - timedelta(days=i)
-        day_dir = STORE_DIR / dt.strftime("%Y") / dt.strftime("%m") / dt.strftime("%d")
-        if day_dir.exists():
+        dt = today - timedelta(days=i)
+        day_dir = STORE_DIR / f"{dt.year:04d}" / f"{dt.month:02d}" / f"{dt.day:02d}"
+        if day_dir.is_dir():
             yield day_dir
 
 
@@ -450,6 +1137,39 @@ def get_host_ips() -> List[str]:
     return sorted(hosts)
 
 
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def _split_allow_list(entries: Sequence[str]) -> Tuple[frozenset, Tuple[IPNetwork, ...]]:
+    exact: Set[str] = set()
+    nets: List[IPNetwork] = []
+    for entry in entries:
+        try:
+            if "/" in entry:
+                nets.append(ipaddress.ip_network(entry, strict=False))
+            else:
+                exact.add(str(ipaddress.ip_address(entry)))
+        except ValueError:
+            LOGGER.warning("ignoring invalid ALLOW_IPS entry: %s", entry)
+    return frozenset(exact), tuple(nets)
+
+
+ALLOW_EXACT, ALLOW_NETS = _split_allow_list(ALLOW_IPS)
+
+
+@functools.lru_cache(maxsize=1024)
+def _ip_ok(ip: str) -> bool:
+    """True when ``ip`` is listed in ALLOW_IPS, either verbatim or inside a CIDR."""
+
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    if str(address) in ALLOW_EXACT:
+        return True
+    return any(address in net for net in ALLOW_NETS)
+
+
 def _client_ip() -> str:
     forwarded = request.headers.get("X-Forwarded-For")
     if forwarded:
@@ -457,22 +1177,139 @@ def _client_ip() -> str:
     return (request.remote_addr or "").strip()
 
 
+_BASIC_EXPECT = b"Basic " + base64.b64encode(f"{BASIC_AUTH_USER}:{BASIC_AUTH_PASS}".encode("utf-8"))
+
+
 def _ensure_auth() -> Optional[Response]:
     if not BASIC_AUTH_USER:
         return None
-    header = request.headers.get("Authorization", "")
-    if not header.startswith("Basic "):
-        return Response("Auth required", 401, {"WWW-Authenticate": 'Basic realm="LILI DICOM"'})
-    try:
-        decoded = base64.b64decode(header.split(" ", 1)[1]).decode("utf-8")
-        user, password = decoded.split(":", 1)
-    except Exception:
-        return Response("Auth required", 401, {"WWW-Authenticate": 'Basic realm="LILI DICOM"'})
-    if user == BASIC_AUTH_USER and password == BASIC_AUTH_PASS:
+    # WSGI header values are latin-1 strings; compare raw bytes in constant time.
+    header = request.headers.get("Authorization", "").encode("latin-1", errors="replace")
+    if hmac.compare_digest(header, _BASIC_EXPECT):
         return None
     return Response("Auth required", 401, {"WWW-Authenticate": 'Basic realm="LILI DICOM"'})
 
 
+# ---------------------------------------------------------------------------
+# Post-store processing
+# ---------------------------------------------------------------------------
+
+# Previews, PDFs and the study manifest are built off the C-STORE callback.
+# Work is debounced per series: each new instance re-arms a timer, and the job
+# runs once no instance has arrived for POST_STORE_DELAY seconds or as soon as
+# the sending association closes. At most one job per series runs at a time;
+# the study sheet and manifest are then rebuilt by a single queued job per study.
+_POST_STORE_POOL = ThreadPoolExecutor(max_workers=POST_STORE_WORKERS, thread_name_prefix="post-store")
+_PENDING_LOCK = threading.Lock()
+_PENDING: Dict[Path, List[Path]] = {}
+_TIMERS: Dict[Path, threading.Timer] = {}
+_RUNNING: Set[Path] = set()
+_STUDY_QUEUED: Set[Path] = set()
+
+
+def _arm_post_store_timer(series_dir: Path) -> None:
+    # Caller holds _PENDING_LOCK.
+    timer = _TIMERS.pop(series_dir, None)
+    if timer is not None:
+        timer.cancel()
+    timer = threading.Timer(POST_STORE_DELAY, flush_post_store, args=([series_dir],))
+    timer.daemon = True
+    _TIMERS[series_dir] = timer
+    timer.start()
+
+
+def schedule_post_store(series_dir: Path, dicom_path: Path) -> None:
+    with _PENDING_LOCK:
+        _PENDING.setdefault(series_dir, []).append(dicom_path)
+        _arm_post_store_timer(series_dir)
+
+
+def flush_post_store(series_dirs: Iterable[Path]) -> None:
+    """Start post-store work for ``series_dirs`` now instead of waiting for the timer."""
+
+    for series_dir in series_dirs:
+        with _PENDING_LOCK:
+            timer = _TIMERS.pop(series_dir, None)
+            if timer is not None:
+                timer.cancel()
+            if series_dir not in _PENDING:
+                continue
+        _POST_STORE_POOL.submit(_post_store_job, series_dir)
+
+
+def _post_store_job(series_dir: Path) -> None:
+    with _PENDING_LOCK:
+        if series_dir in _RUNNING:
+            # Let the running job finish; retry once the timer fires again.
+            if series_dir in _PENDING:
+                _arm_post_store_timer(series_dir)
+            return
+        dicom_paths = _PENDING.pop(series_dir, None)
+        if dicom_paths is None:
+            return
+        _RUNNING.add(series_dir)
+    try:
+        _run_post_store(series_dir, dicom_paths)
+    finally:
+        with _PENDING_LOCK:
+            _RUNNING.discard(series_dir)
+
+
+def _store_preview(series_dir: Path, path: Path) -> None:
+    try:
+        # PixelData is only read if the preview cap still allows a preview.
+        ds = dcmread(str(path), force=True, defer_size="512 KB")
+        preview_path = save_preview_image(ds, series_dir)
+        if preview_path:
+            LOGGER.info("Generated preview %s", preview_path.name)
+    except Exception as exc:
+        LOGGER.warning("Preview generation failed for %s: %s", path.name, exc)
+
+
+def _run_post_store(series_dir: Path, dicom_paths: Sequence[Path]) -> None:
+    for _ in _PREVIEW_POOL.map(lambda path: _store_preview(series_dir, path), dicom_paths):
+        pass
+
+    try:
+        generate_series_pdf(series_dir, allow_preview_generation=False)
+    except Exception as exc:
+        LOGGER.warning("PDF generation failed: %s", exc)
+
+    schedule_study_post_store(series_dir.parent)
+
+
+def schedule_study_post_store(study_dir: Path) -> None:
+    """Queue the study sheet and manifest rebuild, once per study.
+
+    When an association closes, every series of the study finishes at about
+    the same time; while a study job is still queued, later series simply
+    rely on it instead of queueing a render of their own.
+    """
+
+    with _PENDING_LOCK:
+        if study_dir in _STUDY_QUEUED:
+            return
+        _STUDY_QUEUED.add(study_dir)
+    _POST_STORE_POOL.submit(_study_post_store_job, study_dir)
+
+
+def _study_post_store_job(study_dir: Path) -> None:
+    with _PENDING_LOCK:
+        # Cleared before running: a series finishing from here on queues a new job.
+        _STUDY_QUEUED.discard(study_dir)
+
+    if PDF_STUDY:
+        try:
+            generate_study_pdf(study_dir, allow_preview_generation=False)
+        except Exception as exc:
+            LOGGER.warning("PDF generation failed: %s", exc)
+
+    try:
+        write_study_manifest(study_dir)
+    except Exception as exc:
+        LOGGER.warning("Study manifest update failed: %s", exc)
+
+
 # ---------------------------------------------------------------------------
 # DICOM Server
 # ---------------------------------------------------------------------------
@@ -509,11 +1346,14 @@ class DicomServer:
         self.ae.network_timeout = 30
         self.ae.maximum_associations = 25
         self.server = None
+        self._assoc_lock = threading.Lock()
+        self._assoc_series: Dict[object, Set[Path]] = {}
 
     def start(self) -> None:
         handlers = [
             (evt.EVT_C_STORE, self.handle_store),
             (evt.EVT_C_ECHO, self.handle_echo),
+            (evt.EVT_CONN_CLOSE, self.handle_conn_close),
         ]
         self.server = self.ae.start_server(("", self.port), block=False, evt_handlers=handlers)
         LOGGER.info("DICOM server started (AE=%s, port=%s)", self.ae_title, self.port)
@@ -522,6 +1362,11 @@ class DicomServer:
     def handle_echo(event) -> int:  # pragma: no cover - network callback
         return 0x0000
 
+    def handle_conn_close(self, event) -> None:  # pragma: no cover - network callback
+        with self._assoc_lock:
+            series_dirs = self._assoc_series.pop(event.assoc, set())
+        flush_post_store(series_dirs)
+
     def handle_store(self, event) -> int:  # pragma: no cover - network callback
         try:
             ds = event.dataset
@@ -538,30 +1383,20 @@ class DicomServer:
             ds.is_implicit_VR = False
 
             year, month, day = _pick_date_parts(ds)
-            study_uid = getattr(ds, "StudyInstanceUID", datetime.now().strftime("%Y%m%d%H%M%S"))
+            # Fallback UIDs are only formatted when the tag is actually missing.
+            study_uid = getattr(ds, "StudyInstanceUID", None) or datetime.now().strftime("%Y%m%d%H%M%S")
             series_uid = getattr(ds, "SeriesInstanceUID", "UnknownSeries")
-            sop_uid = getattr(ds, "SOPInstanceUID", datetime.now().strftime("%H%M%S%f"))
+            sop_uid = getattr(ds, "SOPInstanceUID", None) or datetime.now().strftime("%H%M%S%f")
 
             series_dir = self.store_dir / year / month / day / study_uid / series_uid
             series_dir.mkdir(parents=True, exist_ok=True)
             outfile = series_dir / f"{sop_uid}.dcm"
             ds.save_as(outfile, write_like_original=False)
             LOGGER.info("Stored SOP %s in %s", sop_uid, series_dir)
-
-            try:
-                preview_path = save_preview_image(ds, series_dir)
-                if preview_path:
-                    LOGGER.info("Generated preview %s", preview_path.name)
-            except Exception as exc:
-                LOGGER.warning("Preview generation failed: %s", exc)
-
-            try:
-                generate_series_pdf(series_dir, allow_preview_generation=False)
-                if PDF_STUDY:
-                    generate_study_pdf(series_dir.parent, allow_preview_generation=False)
-            except Exception as exc:
-                LOGGER.warning("PDF generation failed: %s", exc)
-
+            index_stored_series(series_dir)
+            schedule_post_store(series_dir, outfile)
+            with self._assoc_lock:
+                self._assoc_series.setdefault(event.assoc, set()).add(series_dir)
             return 0x0000
         except Exception as exc:
             LOGGER.exception("C-STORE handler failure: %s", exc)
@@ -585,6 +1420,8 @@ app = Flask(
     template_folder=str(Path(__file__).parent / "templates"),
     static_folder=str(Path(__file__).parent / "static"),
 )
+# Let a fronting web server (Apache mod_xsendfile, lighttpd) stream files itself.
+app.config["USE_X_SENDFILE"] = USE_XSENDFILE
 
 
 @app.before_request
@@ -619,23 +1456,44 @@ def http_logs():
     return jsonify({"lines": tail})
 
 
+PREVIEW_MAX_AGE = 365 * 24 * 3600
+
+
 @app.route("/storage/<path:subpath>")
 def http_storage(subpath: str):
-    return send_from_directory(STORE_DIR, subpath)
+    response = send_from_directory(STORE_DIR, subpath, conditional=True)
+    # Preview names are never reused, so browsers may keep them; PDFs are rebuilt
+    # in place and keep the default no-cache (ETag revalidation, 304 when unchanged).
+    if "/previews/" in subpath:
+        response.cache_control.no_cache = None
+        response.cache_control.private = True
+        response.cache_control.max_age = PREVIEW_MAX_AGE
+    return response
+
+
+_INFO_PAYLOAD = {
+    "ae_title": AE_TITLE,
+    "port": DICOM_PORT,
+    "web_port": WEB_PORT,
+    "store_dir": str(STORE_DIR),
+    "pdf_header": PDF_HEADER,
+    "pdf_study": PDF_STUDY,
+    "basic_auth": bool(BASIC_AUTH_USER),
+    "print_direct": PRINT_DIRECT,
+}
+HOST_IPS_TTL = 60.0
+
+
+@functools.lru_cache(maxsize=1)
+def _host_ips_for(bucket: int) -> Tuple[str, ...]:
+    # ``bucket`` changes every HOST_IPS_TTL seconds, so addresses are re-resolved
+    # at most once per minute (e.g. after the ultrasound cable is plugged in).
+    return tuple(get_host_ips())
 
 
 def _info_payload() -> dict:
-    return {
-        "ae_title": AE_TITLE,
-        "port": DICOM_PORT,
-        "web_port": WEB_PORT,
-        "store_dir": str(STORE_DIR),
-        "host_ips": get_host_ips(),
-        "pdf_header": PDF_HEADER,
-        "pdf_study": PDF_STUDY,
-        "basic_auth": bool(BASIC_AUTH_USER),
-        "print_direct": PRINT_DIRECT,
-    }
+    host_ips = _host_ips_for(int(time.monotonic() // HOST_IPS_TTL))
+    return {**_INFO_PAYLOAD, "host_ips": list(host_ips)}
 
 
 @app.route("/browse")
@@ -645,24 +1503,22 @@ def browse():
     for day_dir in iter_recent_day_dirs(days):
         y, m, d = day_dir.parts[-3:]
         ymd = f"{y}{m}{d}"
-        for study_dir in sorted(p for p in day_dir.iterdir() if p.is_dir()):
-            metadata = collect_study_metadata(study_dir)
-            first_preview = None
+        for study_dir in _subdirs(day_dir):
+            metadata = load_study_manifest(study_dir)
+            # Storage URLs are built from the known layout instead of relative_to().
+            study_rel = f"{y}/{m}/{d}/{study_dir.name}"
             first_preview_url = None
             total_previews = 0
-            for series_dir in sorted(p for p in study_dir.iterdir() if p.is_dir()):
-                previews = _series_preview_files(series_dir)
-                if previews:
-                    total_previews += len(previews)
-                    if not first_preview:
-                        rel = previews[0].relative_to(STORE_DIR)
-                        first_preview = previews[0]
-                        first_preview_url = url_for("http_storage", subpath=str(rel).replace(os.sep, "/"))
-            study_pdf_path = study_dir / "StudyContactSheet.pdf"
+            for series in metadata["series"]:
+                total_previews += series["preview_count"]
+                if not first_preview_url and series["first_preview"]:
+                    first_preview_url = url_for(
+                        "http_storage",
+                        subpath=f"{study_rel}/{series['uid']}/previews/{series['first_preview']}",
+                    )
             study_pdf_url = None
-            if study_pdf_path.exists():
-                rel = study_pdf_path.relative_to(STORE_DIR)
-                study_pdf_url = url_for("http_storage", subpath=str(rel).replace(os.sep, "/"))
+            if metadata["study_pdf"]:
+                study_pdf_url = url_for("http_storage", subpath=f"{study_rel}/StudyContactSheet.pdf")
             studies.append(
                 {
                     "ymd": ymd,
@@ -672,10 +1528,10 @@ def browse():
                     "patient_id": metadata.get("patient_id"),
                     "study_desc": metadata.get("study_desc"),
                     "date_human": metadata.get("study_date") or f"{d}/{m}/{y}",
-                    "first_preview": bool(first_preview),
+                    "first_preview": bool(first_preview_url),
                     "first_preview_url": first_preview_url,
                     "total_previews": total_previews,
-                    "series_count": len([p for p in study_dir.iterdir() if p.is_dir()]),
+                    "series_count": len(metadata["series"]),
                     "study_pdf_url": study_pdf_url,
                     "study_page_url": url_for("study_page", ymd=ymd, study_uid=study_dir.name),
                     "zip_url": url_for("download_study_zip", ymd=ymd, study_uid=study_dir.name),
@@ -720,12 +1576,13 @@ def study_page(ymd: str, study_uid: str):
     study_dir = STORE_DIR / y / m / d / study_uid
     if not study_dir.exists():
         abort(404, description="Estudo não encontrado")
-    metadata = collect_study_metadata(study_dir)
+    series_dirs = _subdirs(study_dir)
+    metadata = collect_study_metadata(study_dir, series_dirs)
     metadata["date_human"] = metadata.get("study_date") or f"{d}/{m}/{y}"
     metadata["study_pdf_url"] = url_for("http_pdf_study", study_uid=study_uid)
     metadata["zip_url"] = url_for("download_study_zip", ymd=ymd, study_uid=study_uid)
     series_rows = []
-    for series_dir in sorted(p for p in study_dir.iterdir() if p.is_dir()):
+    for series_dir in series_dirs:
         previews = _series_preview_files(series_dir)
         series_rows.append(
             {
@@ -752,45 +1609,141 @@ def download_study_zip(ymd: str, study_uid: str):
     study_dir = STORE_DIR / y / m / d / study_uid
     if not study_dir.exists():
         abort(404, description="Estudo não encontrado")
-    buffer = io.BytesIO()
-    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-        for file_path in study_dir.rglob("*"):
-            if file_path.is_file():
-                arcname = file_path.relative_to(study_dir)
-                zf.write(file_path, arcname=str(arcname))
-    buffer.seek(0)
-    return send_file(
-        buffer,
+    return Response(
+        _iter_study_zip(study_dir),
         mimetype="application/zip",
-        as_attachment=True,
-        download_name=f"{study_uid}.zip",
+        headers={"Content-Disposition": f'attachment; filename="{study_uid}.zip"'},
     )
 
 
+class _ZipChunkSink(io.RawIOBase):
+    """Write-only, non-seekable sink that lets ZipFile emit an archive in chunks."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+ZIP_CHUNK_SIZE = 1024 * 1024
+# Encapsulated pixel data gains nothing from deflate; only native DICOM is compressed.
+COMPRESSED_TS = {
+    JPEGBaseline,
+    JPEGExtended,
+    JPEGLossless,
+    JPEGLosslessSV1,
+    JPEGLSNearLossless,
+    JPEGLSLossless,
+    RLELossless,
+    DeflatedExplicitVRLittleEndian,
+}
+
+
+_ZIP_SKIP_NAMES = {STUDY_MANIFEST, PDF_STATE_NAME}
+
+
+def _walk_files(root: Path, prefix: str = "") -> Iterator[Tuple[str, str]]:
+    """Yield ``(path, arcname)`` for every file under ``root`` using scandir.
+
+    Hidden entries (e.g. the PDF frame cache in ``.pdf_cache``) are internal
+    and left out of the archive, as are ``.tmp`` files still being written.
+    """
+
+    with os.scandir(root) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.name.startswith("."):
+            continue
+        arcname = prefix + entry.name
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk_files(Path(entry.path), arcname + "/")
+        elif entry.is_file() and entry.name not in _ZIP_SKIP_NAMES and not entry.name.endswith(".tmp"):
+            yield entry.path, arcname
+
+
+def _zip_compress_type(path: str) -> int:
+    if not path.endswith(".dcm"):
+        return zipfile.ZIP_STORED
+    try:
+        ts = read_file_meta_info(path).get("TransferSyntaxUID")
+    except Exception:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_STORED if ts in COMPRESSED_TS else zipfile.ZIP_DEFLATED
+
+
+def _iter_study_zip(study_dir: Path) -> Iterator[bytes]:
+    sink = _ZipChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for file_path, arcname in _walk_files(study_dir):
+            zinfo = zipfile.ZipInfo.from_file(file_path, arcname=arcname)
+            zinfo.compress_type = _zip_compress_type(file_path)
+            if sys.version_info >= (3, 13):
+                zinfo.compress_level = 1
+            else:
+                # Before 3.13 the level only exists as this private attribute,
+                # which ZipFile.open(zinfo, "w") reads; relied on deliberately.
+                zinfo._compresslevel = 1
+            with open(file_path, "rb") as src, zf.open(zinfo, "w") as dst:
+                while True:
+                    block = src.read(ZIP_CHUNK_SIZE)
+                    if not block:
+                        break
+                    dst.write(block)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+
 def _ensure_series_pdf(series_uid: str) -> Path:
     series_dir = find_series_dir(series_uid)
     if series_dir is None:
         abort(404, description="Série não encontrada")
-    return generate_series_pdf(series_dir, allow_preview_generation=True)
+    pdf_path = generate_series_pdf(series_dir, allow_preview_generation=True)
+    write_study_manifest(series_dir.parent)
+    return pdf_path
 
 
 def _ensure_study_pdf(study_uid: str) -> Path:
     study_dir = find_study_dir(study_uid)
     if study_dir is None:
         abort(404, description="Estudo não encontrado")
-    return generate_study_pdf(study_dir, allow_preview_generation=True)
+    pdf_path = generate_study_pdf(study_dir, allow_preview_generation=True)
+    write_study_manifest(study_dir)
+    return pdf_path
+
+
+def _send_pdf(pdf_path: Path) -> Response:
+    return send_file(
+        pdf_path,
+        mimetype="application/pdf",
+        as_attachment=False,
+        conditional=True,
+        etag=True,
+        last_modified=pdf_path.stat().st_mtime,
+    )
 
 
 @app.route("/pdf/study/<study_uid>")
 def http_pdf_study(study_uid: str):
     pdf_path = _ensure_study_pdf(study_uid)
-    return send_file(pdf_path, mimetype="application/pdf", as_attachment=False)
+    return _send_pdf(pdf_path)
 
 
 @app.route("/pdf/series/<series_uid>")
 def http_pdf_series(series_uid: str):
     pdf_path = _ensure_series_pdf(series_uid)
-    return send_file(pdf_path, mimetype="application/pdf", as_attachment=False)
+    return _send_pdf(pdf_path)
 
 
 def _print_via_lp(pdf_path: Path) -> Tuple[bool, str]:
@@ -825,7 +1778,7 @@ def http_print_study(study_uid: str):
         return redirect(url_for("http_pdf_study", study_uid=study_uid))
     if not PRINT_DIRECT:
         abort(403, description="Impressão direta desabilitada")
-    if _client_ip() not in ALLOW_IPS:
+    if not _ip_ok(_client_ip()):
         abort(403, description="IP não autorizado para impressão direta")
     ok, message = _print_via_lp(pdf_path)
     status = 200 if ok else 500
@@ -840,7 +1793,7 @@ def http_print_series(series_uid: str):
         return redirect(url_for("http_pdf_series", series_uid=series_uid))
     if not PRINT_DIRECT:
         abort(403, description="Impressão direta desabilitada")
-    if _client_ip() not in ALLOW_IPS:
+    if not _ip_ok(_client_ip()):
         abort(403, description="IP não autorizado para impressão direta")
     ok, message = _print_via_lp(pdf_path)
     status = 200 if ok else 500
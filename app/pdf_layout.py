@@ -1,5 +1,6 @@
 # app/pdf_layout.py
 import os, json
+from functools import lru_cache
 from reportlab.lib.utils import ImageReader
 
 def _draw_fit(c, img_reader: ImageReader, x, y, w, h, pad=6):
@@ -13,6 +14,41 @@ def _draw_fit(c, img_reader: ImageReader, x, y, w, h, pad=6):
     dy = y + (h - dh) / 2.0
     c.drawImage(img_reader, dx, dy, width=dw, height=dh, mask='auto')
 
+# Layout lido do ambiente uma única vez, na importação; configure_layout() altera em execução.
+_LAYOUT_SPEC = os.getenv("PDF_LAYOUT_SPEC", "").strip()
+_LAYOUT_PRESET = os.getenv("PDF_LAYOUT_PRESET", "").strip().upper()
+
+def configure_layout(preset=None, spec=None):
+    """Substitui PDF_LAYOUT_PRESET / PDF_LAYOUT_SPEC sem depender do ambiente."""
+    global _LAYOUT_PRESET, _LAYOUT_SPEC
+    if preset is not None:
+        _LAYOUT_PRESET = preset.strip().upper()
+    if spec is not None:
+        _LAYOUT_SPEC = spec.strip()
+
+def has_mosaic():
+    """True se há preset/JSON de mosaico configurado (senão o chamador usa a grade)."""
+    return bool(_LAYOUT_SPEC) or _LAYOUT_PRESET == "GRUPO1"
+
+@lru_cache(maxsize=8)
+def _relative_slots(spec, preset):
+    """Slots relativos (x, y, w, h em 0..1); o JSON é interpretado uma vez por valor."""
+    if spec:
+        return tuple((r["x"], r["y"], r["w"], r["h"]) for r in json.loads(spec))
+    if preset == "GRUPO1":
+        # Topo: 2 blocos grandes; Meio/baixo: 6 miniaturas
+        return (
+            (0.00, 0.55, 0.66, 0.45),
+            (0.66, 0.55, 0.34, 0.45),
+            (0.00, 0.27, 0.33, 0.25),
+            (0.33, 0.27, 0.33, 0.25),
+            (0.66, 0.27, 0.34, 0.25),
+            (0.00, 0.00, 0.33, 0.25),
+            (0.33, 0.00, 0.33, 0.25),
+            (0.66, 0.00, 0.34, 0.25),
+        )
+    return ()
+
 def _iter_slots(content_x, content_y, content_w, content_h):
     """
     Define os slots (retângulos) do layout.
@@ -20,35 +56,10 @@ def _iter_slots(content_x, content_y, content_w, content_h):
     - Se PDF_LAYOUT_PRESET=GRUPO1, usa um mosaico “estilo anexo”.
     - Caso contrário, retorna lista vazia (o chamador cai no layout grade).
     """
-    spec = os.getenv("PDF_LAYOUT_SPEC", "").strip()
-    if spec:
-        slots_rel = json.loads(spec)
-    else:
-        preset = os.getenv("PDF_LAYOUT_PRESET", "").strip().upper()
-        if preset == "GRUPO1":
-            # Topo: 2 blocos grandes; Meio/baixo: 6 miniaturas
-            slots_rel = [
-                {"x":0.00, "y":0.55, "w":0.66, "h":0.45},
-                {"x":0.66, "y":0.55, "w":0.34, "h":0.45},
-                {"x":0.00, "y":0.27, "w":0.33, "h":0.25},
-                {"x":0.33, "y":0.27, "w":0.33, "h":0.25},
-                {"x":0.66, "y":0.27, "w":0.34, "h":0.25},
-                {"x":0.00, "y":0.00, "w":0.33, "h":0.25},
-                {"x":0.33, "y":0.00, "w":0.33, "h":0.25},
-                {"x":0.66, "y":0.00, "w":0.34, "h":0.25},
-            ]
-        else:
-            slots_rel = []
-
-    slots_abs = []
-    for r in slots_rel:
-        slots_abs.append((
-            content_x + r["x"] * content_w,
-            content_y + r["y"] * content_h,
-            r["w"] * content_w,
-            r["h"] * content_h,
-        ))
-    return slots_abs
+    return [
+        (content_x + x * content_w, content_y + y * content_h, w * content_w, h * content_h)
+        for x, y, w, h in _relative_slots(_LAYOUT_SPEC, _LAYOUT_PRESET)
+    ]
 
 def render_page_mosaic(c, page_imgs, content_x, content_y, content_w, content_h):
     """
@@ -58,8 +69,8 @@ def render_page_mosaic(c, page_imgs, content_x, content_y, content_w, content_h)
     slots = _iter_slots(content_x, content_y, content_w, content_h)
     if not slots:
         return False
-    for img in page_imgs[:len(slots)]:
-        reader = ImageReader(img)  # BytesIO ou caminho de arquivo
-        x, y, w, h = slots.pop(0)
+    for img, (x, y, w, h) in zip(page_imgs, slots):
+        # aceita ImageReader já pronto (reaproveitado pelo chamador), BytesIO ou caminho
+        reader = img if isinstance(img, ImageReader) else ImageReader(img)
         _draw_fit(c, reader, x, y, w, h)
     return True
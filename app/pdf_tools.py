@@ -1,27 +1,89 @@
 # app/pdf_tools.py
-import os, io, glob, shutil
+import os, io, heapq, shutil, tempfile, threading, zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 from reportlab.lib import colors
 from reportlab.lib.utils import ImageReader
+from reportlab import rl_config
 
 import pydicom
+from pydicom.multival import MultiValue
 from pydicom.pixel_data_handlers.util import apply_voi_lut
 import numpy as np
 from PIL import Image
 
-from .pdf_layout import render_page_mosaic, _draw_fit
+from .pdf_layout import render_page_mosaic, configure_layout, has_mosaic
+
+# Layout e cor lidos do ambiente uma única vez, na importação; use configure() para alterar.
+_PDF_COLS = int(os.getenv("PDF_COLS", "4"))
+_PDF_ROWS = int(os.getenv("PDF_ROWS", "2"))
+_BRAND_COLOR = colors.HexColor(os.getenv("BRAND_COLOR", "#255375"))
+# formato dos frames embutidos, threads de decodificação por PDF e cabeçalho das páginas
+_PDF_IMG_FORMAT = os.getenv("PDF_IMG_FORMAT", "JPEG").strip().upper()
+_PDF_PNG_LEVEL = int(os.getenv("PDF_PNG_LEVEL", "1"))
+_PDF_JPEG_Q = int(os.getenv("PDF_JPEG_Q", "85"))
+_PDF_WORKERS = int(os.getenv("PDF_WORKERS", "4"))
+_PDF_HEADER = os.getenv("PDF_HEADER", "")
+# cache em disco dos frames codificados, por série (diretório oculto: listagens o ignoram)
+_FRAME_CACHE = os.getenv("PDF_FRAME_CACHE", "1").strip() != "0"
+_FRAME_CACHE_DIR = ".pdf_cache"
+# JPEG embutido como está (DCTDecode), sem a camada ASCII85 que o infla em ~25%
+rl_config.useA85 = 0
+# maior lado (px) de cada frame embutido; células do PDF raramente passam de ~500 px
+_PDF_MAX_DIM = int(os.getenv("PDF_MAX_DIM", "1024"))
+
+def configure(cols=None, rows=None, layout_preset=None, layout_spec=None, brand_color=None, max_dim=None,
+              img_format=None, png_level=None, jpeg_quality=None, workers=None, header=None):
+    """Altera o layout dos PDFs em tempo de execução (o ambiente não é relido)."""
+    global _PDF_COLS, _PDF_ROWS, _BRAND_COLOR, _PDF_MAX_DIM
+    global _PDF_IMG_FORMAT, _PDF_PNG_LEVEL, _PDF_JPEG_Q, _PDF_WORKERS, _PDF_HEADER
+    if max_dim is not None:
+        _PDF_MAX_DIM = int(max_dim)
+    if cols is not None:
+        _PDF_COLS = int(cols)
+    if rows is not None:
+        _PDF_ROWS = int(rows)
+    if brand_color is not None:
+        _BRAND_COLOR = colors.HexColor(brand_color)
+    if img_format is not None:
+        _PDF_IMG_FORMAT = img_format.strip().upper()
+    if png_level is not None:
+        _PDF_PNG_LEVEL = int(png_level)
+    if jpeg_quality is not None:
+        _PDF_JPEG_Q = int(jpeg_quality)
+    if workers is not None:
+        _PDF_WORKERS = int(workers)
+    if header is not None:
+        _PDF_HEADER = header
+    configure_layout(preset=layout_preset, spec=layout_spec)
+
+def _slots_per_page():
+    return 8 if has_mosaic() else _PDF_COLS * _PDF_ROWS
 
 def find_first_dir(root, name):
-    """Procura (recursivamente) o diretório cujo basename == name e retorna o caminho."""
-    for cur, dirs, files in os.walk(root):
-        if os.path.basename(cur) == name:
-            return cur
-        for d in dirs:
-            if d == name:
-                return os.path.join(cur, d)
+    """
+    Procura (em largura) o diretório cujo basename == name e retorna o caminho.
+    Usa os.scandir e só olha diretórios: arquivos (.dcm, previews) não são listados nem "stat"ados.
+    """
+    if os.path.basename(os.path.normpath(root)) == name:
+        return root
+    queue = deque([root])
+    while queue:
+        cur = queue.popleft()
+        try:
+            with os.scandir(cur) as it:
+                subdirs = [e for e in it if e.is_dir()]
+        except OSError:
+            continue
+        for e in subdirs:
+            if e.name == name:
+                return e.path
+        # como os.walk: não segue links simbólicos para diretórios
+        queue.extend(e.path for e in subdirs if not e.is_symlink())
     return None
 
 def _human_ts_name(ts):
@@ -30,20 +92,69 @@ def _human_ts_name(ts):
     except Exception:
         return f"{ts!r}"
 
-def _dicom_to_pil(ds):
-    """Converte um dataset DICOM em PIL.Image (8-bit) respeitando VOI LUT quando possível."""
-    arr = ds.pixel_array  # pode lançar NotImplementedError para compressão não suportada
+_WINDOW_TAGS = ["PhotometricInterpretation", "VOILUTFunction", "WindowCenter", "WindowWidth",
+                "RescaleSlope", "RescaleIntercept"]
+
+def _series_window(ds_head):
+    """
+    Janela VOI linear (WindowCenter/WindowWidth) da série convertida para valores
+    armazenados (desfaz RescaleSlope/Intercept). Retorna (lo, hi) ou None.
+    """
     try:
-        arr = apply_voi_lut(arr, ds)
-    except Exception:
-        pass
-    if getattr(ds, "PhotometricInterpretation", "MONOCHROME2").startswith("MONO"):
-        arr = arr.astype(np.float32)
-        lo, hi = float(np.min(arr)), float(np.max(arr))
-        if hi <= lo: hi = lo + 1.0
-        arr = (arr - lo) / (hi - lo)
-        arr = (arr * 255.0).clip(0, 255).astype(np.uint8)
-        im = Image.fromarray(arr, mode="L").convert("RGB")
+        if not getattr(ds_head, "PhotometricInterpretation", "MONOCHROME2").startswith("MONO"):
+            return None
+        if str(getattr(ds_head, "VOILUTFunction", "") or "LINEAR").upper() != "LINEAR":
+            return None
+        wc, ww = ds_head.WindowCenter, ds_head.WindowWidth
+        if isinstance(wc, MultiValue): wc = wc[0]
+        if isinstance(ww, MultiValue): ww = ww[0]
+        wc, ww = float(wc), float(ww)
+        slope = float(getattr(ds_head, "RescaleSlope", 1) or 1)
+        intercept = float(getattr(ds_head, "RescaleIntercept", 0) or 0)
+    except (AttributeError, TypeError, ValueError, IndexError):
+        return None
+    if ww <= 1:
+        return None
+    # DICOM PS3.3 C.11.2.1.2.1 (função LINEAR); slope negativo gera lo > hi (imagem invertida)
+    lo = (wc - 0.5 - (ww - 1) / 2.0 - intercept) / slope
+    hi = (wc - 0.5 + (ww - 1) / 2.0 - intercept) / slope
+    return lo, hi
+
+def _gray_to_pil(arr):
+    """uint8 2D -> PIL "L" sem cópia: frombuffer mapeia o buffer do numpy (e mantém a referência)."""
+    arr = np.ascontiguousarray(arr)
+    return Image.frombuffer("L", (arr.shape[1], arr.shape[0]), arr, "raw", "L", 0, 1)
+
+def _dicom_to_pil(ds, window=None):
+    """
+    Converte um dataset DICOM em PIL.Image 8-bit ("L" se monocromático, "RGB" se colorido),
+    respeitando VOI LUT quando possível.
+    window: (lo, hi) da série (ver _series_window); evita VOI LUT e min/max por frame.
+    """
+    arr = ds.pixel_array  # pode lançar NotImplementedError para compressão não suportada
+    photometric = getattr(ds, "PhotometricInterpretation", "MONOCHROME2")
+    if (photometric == "MONOCHROME2" and arr.dtype == np.uint8 and arr.ndim == 2
+            and "WindowCenter" not in ds and "VOILUTSequence" not in ds):
+        # 8 bits sem janela (captura secundária): já está pronto para exibição
+        return _gray_to_pil(arr)
+    mono = photometric.startswith("MONO")
+    if not (mono and window):
+        window = None
+        try:
+            arr = apply_voi_lut(arr, ds)
+        except Exception:
+            pass
+    if mono:
+        if window:
+            lo, hi = window
+        else:
+            lo, hi = float(np.min(arr)), float(np.max(arr))
+            if hi <= lo: hi = lo + 1.0
+        # um único buffer float32, operado in-place (sem cópias intermediárias)
+        buf = np.subtract(arr, lo, dtype=np.float32)
+        np.multiply(buf, np.float32(255.0 / (hi - lo)), out=buf)
+        np.clip(buf, 0, 255, out=buf)
+        im = _gray_to_pil(buf.astype(np.uint8))
     else:
         if arr.dtype != np.uint8:
             m = float(arr.max()) if arr.max() else 1.0
@@ -54,58 +165,204 @@ def _dicom_to_pil(ds):
             im = Image.fromarray(arr).convert("RGB")
     return im
 
-def _collect_images_from_series(series_dir, max_per_series=None):
-    """
-    Coleta imagens (primeiras instâncias de cada série). Retorna (streams, notas).
-    """
-    streams, notes = [], []
-    dcms = sorted(glob.glob(os.path.join(series_dir, "*.dcm")))
+def _downscale_for_pdf(im):
+    """Reduz frames maiores que _PDF_MAX_DIM antes de codificar (0 desativa)."""
+    if _PDF_MAX_DIM > 0 and max(im.size) > _PDF_MAX_DIM:
+        # BILINEAR basta para as células do mosaico e é bem mais rápido que LANCZOS
+        im.thumbnail((_PDF_MAX_DIM, _PDF_MAX_DIM), Image.BILINEAR)
+    return im
+
+def _frame_save_kwargs():
+    # JPEG é embutido no PDF como DCTDecode sem recompressão; PDF_IMG_FORMAT=PNG
+    # volta ao PNG sem perdas (nível baixo só troca tamanho por CPU)
+    if _PDF_IMG_FORMAT == "PNG":
+        return {"format": "PNG", "compress_level": _PDF_PNG_LEVEL}
+    return {"format": "JPEG", "quality": _PDF_JPEG_Q, "optimize": False, "progressive": False}
+
+def _iter_dcms(path, recursive=False):
+    """Gera os caminhos .dcm de path via os.scandir, sem stat por arquivo (ocultos ignorados, como no glob)."""
+    try:
+        with os.scandir(path) as it:
+            entries = [e for e in it if not e.name.startswith(".")]
+    except OSError:
+        return
+    for e in entries:
+        if e.name.endswith(".dcm") and e.is_file():
+            yield e.path
+        elif recursive and e.is_dir(follow_symlinks=False):
+            yield from _iter_dcms(e.path, recursive=True)
+
+def _first_dcms(series_dir, limit=None):
+    """Os `limit` primeiros .dcm em ordem de caminho (todos se limit for None)."""
+    dcms = list(_iter_dcms(series_dir))
     if not dcms:
-        dcms = sorted(glob.glob(os.path.join(series_dir, "**", "*.dcm"), recursive=True))
+        dcms = list(_iter_dcms(series_dir, recursive=True))
+    # nsmallest evita ordenar a série inteira quando só as primeiras instâncias importam
+    return heapq.nsmallest(limit, dcms) if limit else sorted(dcms)
+
+# a janela da série vem do primeiro destes cabeçalhos que a tiver (um localizer sem
+# WindowCenter no início não derruba a série inteira para min/max por frame); o mesmo
+# número vale para o PDF da série e o do estudo, que assim usam a mesma janela
+_WINDOW_PROBE = 8
+
+def _probe_window(dcms):
+    for fp in dcms[:_WINDOW_PROBE]:
+        try:
+            window = _series_window(pydicom.dcmread(fp, stop_before_pixels=True, force=True, specific_tags=_WINDOW_TAGS))
+        except Exception:
+            continue
+        if window:
+            return window
+    return None
+
+def _series_jobs(series_dir, max_per_series=None):
+    """Lista (arquivo, janela) de uma série; a janela VOI vem de _probe_window."""
+    dcms = _first_dcms(series_dir, max(max_per_series, _WINDOW_PROBE) if max_per_series else None)
+    window = _probe_window(dcms)
     if max_per_series:
         dcms = dcms[:max_per_series]
-    for fp in dcms:
-        ts_uid = None
+    return [(fp, window) for fp in dcms]
+
+def _cached_frame_path(fp, window, save_kwargs):
+    """
+    Caminho do frame já codificado em <série>/.pdf_cache. O .dcm é gravado como <SOPInstanceUID>.dcm,
+    então o nome do arquivo já identifica a instância; o sufixo muda se janela/tamanho/formato mudarem.
+    """
+    tag = zlib.crc32(repr((window, _PDF_MAX_DIM, sorted(save_kwargs.items()))).encode()) & 0xFFFFFFFF
+    stem = os.path.splitext(os.path.basename(fp))[0]
+    ext = "." + save_kwargs["format"].lower()
+    return os.path.join(os.path.dirname(fp), _FRAME_CACHE_DIR, f"{stem}_{tag:08x}{ext}")
+
+def _cache_hit(cached, fp):
+    try:
+        return os.stat(cached).st_mtime_ns >= os.stat(fp).st_mtime_ns
+    except OSError:
+        return False
+
+def _store_in_cache(pil, cached, save_kwargs):
+    """Grava o frame no cache (escrita atômica). Retorna o caminho ou None se não der para gravar."""
+    tmp = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        pil.save(tmp, **save_kwargs)
+        os.replace(tmp, cached)
+    except Exception:
+        return None
+    finally:
+        # após o os.replace o tmp já não existe; em qualquer falha ele não fica para trás
         try:
-            # pega TS sem carregar PixelData
-            ds_head = pydicom.dcmread(fp, stop_before_pixels=True, force=True)
-            ts_uid = getattr(ds_head, "file_meta", None)
-            ts_uid = getattr(ts_uid, "TransferSyntaxUID", None)
-        except Exception:
+            os.remove(tmp)
+        except OSError:
             pass
-        try:
-            ds = pydicom.dcmread(fp, force=True)
-            if not hasattr(ds, "PixelData"):
-                continue
-            pil = _dicom_to_pil(ds)
-            bio = io.BytesIO()
-            pil.save(bio, format="PNG")
-            bio.seek(0)
+    _prune_frame_cache(cached)
+    return cached
+
+def _prune_frame_cache(cached):
+    """
+    Limpeza do .pdf_cache, feita a cada frame gravado: remove as outras versões do mesmo
+    .dcm (<stem>_<tag> de janela/tamanho/formato anteriores) e frames cujo .dcm não existe mais.
+    Apagar a série apaga o cache junto; o diretório pode ser removido a qualquer momento.
+    """
+    cache_dir = os.path.dirname(cached)
+    series_dir = os.path.dirname(cache_dir)
+    keep = os.path.basename(cached)
+    stem = keep.rsplit("_", 1)[0]
+    try:
+        with os.scandir(cache_dir) as it:
+            names = [e.name for e in it if e.name != keep and not e.name.endswith(".tmp")]
+    except OSError:
+        return
+    for name in names:
+        src_stem = name.rsplit("_", 1)[0]
+        if src_stem == stem or not os.path.exists(os.path.join(series_dir, src_stem + ".dcm")):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+def _decode_one(job, save_kwargs, out_path=None):
+    """
+    Decodifica um arquivo da série. Retorna (imagem ou None, nota ou None).
+    Com out_path a imagem é gravada em disco e o caminho é retornado; senão, um BytesIO.
+    Com PDF_FRAME_CACHE ativo, frames já codificados (e mais novos que o .dcm) são reaproveitados.
+    """
+    fp, window = job
+    cached = _cached_frame_path(fp, window, save_kwargs) if _FRAME_CACHE else None
+    if cached and _cache_hit(cached, fp):
+        if out_path:
+            return cached, None
+        with open(cached, "rb") as f:
+            return io.BytesIO(f.read()), None
+    ds = None
+    try:
+        # leitura única: o TS para a nota de erro vem do file_meta já carregado
+        ds = pydicom.dcmread(fp, force=True)
+        if not hasattr(ds, "PixelData"):
+            return None, None
+        pil = _downscale_for_pdf(_dicom_to_pil(ds, window))
+        stored = _store_in_cache(pil, cached, save_kwargs) if cached else None
+        if stored and out_path:
+            return stored, None
+        if out_path:
+            pil.save(out_path, **save_kwargs)
+            return out_path, None
+        bio = io.BytesIO()
+        pil.save(bio, **save_kwargs)
+        bio.seek(0)
+        return bio, None
+    except NotImplementedError:
+        ts_uid = getattr(getattr(ds, "file_meta", None), "TransferSyntaxUID", None)
+        return None, f"Compressão não suportada em {os.path.basename(fp)} (TS={_human_ts_name(ts_uid)})"
+    except Exception as e:
+        return None, f"Falha ao ler {os.path.basename(fp)}: {e.__class__.__name__}"
+
+def _decode_jobs(jobs, tmpdir=None):
+    """
+    Decodifica os arquivos em paralelo (pydicom/Pillow liberam o GIL), preservando a ordem.
+    PDF_WORKERS limita as threads por PDF, já que cada requisição gunicorn pode gerar um.
+    Com tmpdir as imagens vão para arquivos nesse diretório em vez de ficarem em memória.
+    """
+    streams, notes = [], []
+    save_kwargs = _frame_save_kwargs()
+    ext = "." + save_kwargs["format"].lower()
+    outs = [os.path.join(tmpdir, f"{i:05d}{ext}") if tmpdir else None for i in range(len(jobs))]
+    workers = max(1, min(_PDF_WORKERS, len(jobs)))
+    if workers == 1:
+        results = [_decode_one(job, save_kwargs, out) for job, out in zip(jobs, outs)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(lambda job, out: _decode_one(job, save_kwargs, out), jobs, outs))
+    for bio, note in results:
+        if bio is not None:
             streams.append(bio)
-        except NotImplementedError:
-            notes.append(f"Compressão não suportada em {os.path.basename(fp)} (TS={_human_ts_name(ts_uid)})")
-        except Exception as e:
-            notes.append(f"Falha ao ler {os.path.basename(fp)}: {e.__class__.__name__}")
+        if note:
+            notes.append(note)
     return streams, notes
 
-def _collect_images_from_study(study_dir, max_series=None, max_per_series=1):
+def _collect_images_from_series(series_dir, max_per_series=None, tmpdir=None):
+    """
+    Coleta imagens (primeiras instâncias de cada série). Retorna (streams, notas).
+    Com tmpdir, retorna caminhos de arquivos dentro dele em vez de streams.
+    """
+    return _decode_jobs(_series_jobs(series_dir, max_per_series), tmpdir)
+
+def _collect_images_from_study(study_dir, max_series=None, max_per_series=1, tmpdir=None):
     """Coleta imagens do estudo – por padrão 1 imagem por série. Retorna (imgs, notas)."""
-    imgs, notes = [], []
-    subdirs = [d for d in sorted(os.listdir(study_dir)) if os.path.isdir(os.path.join(study_dir, d))]
+    subdirs = [d for d in sorted(os.listdir(study_dir))
+               if not d.startswith(".") and os.path.isdir(os.path.join(study_dir, d))]
     if max_series:
         subdirs = subdirs[:max_series]
+    # um único pool para todas as séries: com 1 imagem por série o paralelismo está entre séries
+    jobs = []
     for d in subdirs:
-        series_dir = os.path.join(study_dir, d)
-        s_imgs, s_notes = _collect_images_from_series(series_dir, max_per_series=max_per_series)
-        imgs.extend(s_imgs)
-        notes.extend(s_notes)
-    return imgs, notes
+        jobs.extend(_series_jobs(os.path.join(study_dir, d), max_per_series=max_per_series))
+    return _decode_jobs(jobs, tmpdir)
 
 def _page_header(c, header_text, page_w, page_h, margin_left, margin_top):
     if not header_text:
         return 0.0
     c.setFont("Helvetica-Bold", 11)
-    c.setFillColor(colors.HexColor(os.getenv("BRAND_COLOR", "#255375")))
+    c.setFillColor(_BRAND_COLOR)
     c.drawString(margin_left, page_h - margin_top + 0.3*cm, header_text)
     return 0.9*cm  # altura reservada do cabeçalho
 
@@ -148,30 +405,33 @@ def _save_pdf(pages_images, out_path, title_header=None):
     margin_right = 1.5*cm
     margin_bottom = 1.7*cm
     margin_top = 1.7*cm
+    rows, cols = _PDF_ROWS, _PDF_COLS
+    content_x = margin_left
+    content_y = margin_bottom
+    content_w = page_w - margin_left - margin_right
+    cell_w = content_w / float(cols)
+    pad = 6
 
     for page_imgs in pages_images:
         header_h = _page_header(c, title_header, page_w, page_h, margin_left, margin_top)
-        content_x = margin_left
-        content_y = margin_bottom
-        content_w = page_w - margin_left - margin_right
         content_h = page_h - header_h - margin_bottom
 
-        used = render_page_mosaic(c, page_imgs, content_x, content_y, content_w, content_h)
+        # um ImageReader por imagem, compartilhado pelo mosaico e pela grade
+        readers = [ImageReader(img) for img in page_imgs]
+        used = render_page_mosaic(c, readers, content_x, content_y, content_w, content_h)
         if not used:
-            rows = int(os.getenv("PDF_ROWS", "2"))
-            cols = int(os.getenv("PDF_COLS", "4"))
-            cell_w = content_w / float(cols)
             cell_h = content_h / float(rows)
-            i = 0
-            for r in range(rows):
-                for col in range(cols):
-                    if i >= len(page_imgs):
-                        break
-                    reader = ImageReader(page_imgs[i])
-                    x = content_x + col * cell_w
-                    y = content_y + (rows - 1 - r) * cell_h
-                    _draw_fit(c, reader, x, y, cell_w, cell_h)
-                    i += 1
+            # células em ordem de leitura (linha de cima primeiro); encaixe de _draw_fit em linha
+            cells = [(content_x + col * cell_w, content_y + (rows - 1 - r) * cell_h)
+                     for r in range(rows) for col in range(cols)]
+            fit_w = cell_w - 2 * pad
+            fit_h = cell_h - 2 * pad
+            for reader, (x, y) in zip(readers, cells):
+                iw, ih = reader.getSize()
+                s = max(min(fit_w / float(iw), fit_h / float(ih)), 0.001)
+                dw, dh = iw * s, ih * s
+                c.drawImage(reader, x + (cell_w - dw) / 2.0, y + (cell_h - dh) / 2.0,
+                            width=dw, height=dh, mask='auto')
         c.showPage()
     c.save()
     return out_path
@@ -182,17 +442,19 @@ def build_study_pdf(study_dir, study_uid, store_dir):
     Nome: <study_dir>/_study.pdf
     """
     out_path = os.path.join(study_dir, "_study.pdf")
-    imgs, notes = _collect_images_from_study(study_dir, max_per_series=1)
-    if not imgs:
-        # Gera PDF de diagnóstico em vez de estourar 500
-        header = os.getenv("PDF_HEADER", "")
-        return _save_empty_pdf(out_path, header, notes)
-    slots = int(os.getenv("PDF_COLS", "4")) * int(os.getenv("PDF_ROWS", "2"))
-    if os.getenv("PDF_LAYOUT_PRESET", "").strip().upper() == "GRUPO1" or os.getenv("PDF_LAYOUT_SPEC", "").strip():
-        slots = 8
-    pages = [imgs[i:i+slots] for i in range(0, len(imgs), slots)]
-    header = os.getenv("PDF_HEADER", "")
-    return _save_pdf(pages, out_path, title_header=header)
+    # frames vão para um diretório temporário (não para a memória) até o PDF ser salvo
+    tmpdir = tempfile.mkdtemp(prefix="lili_pdf_")
+    try:
+        imgs, notes = _collect_images_from_study(study_dir, max_per_series=1, tmpdir=tmpdir)
+        header = _PDF_HEADER
+        if not imgs:
+            # Gera PDF de diagnóstico em vez de estourar 500
+            return _save_empty_pdf(out_path, header, notes)
+        slots = _slots_per_page()
+        pages = [imgs[i:i+slots] for i in range(0, len(imgs), slots)]
+        return _save_pdf(pages, out_path, title_header=header)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
 
 def build_series_pdf(series_dir, series_uid):
     """
@@ -200,13 +462,14 @@ def build_series_pdf(series_dir, series_uid):
     Nome: <series_dir>/_series_<series_uid>.pdf
     """
     out_path = os.path.join(series_dir, f"_series_{series_uid}.pdf")
-    imgs, notes = _collect_images_from_series(series_dir, max_per_series=8)
-    if not imgs:
-        header = os.getenv("PDF_HEADER", "")
-        return _save_empty_pdf(out_path, header, notes)
-    slots = int(os.getenv("PDF_COLS", "4")) * int(os.getenv("PDF_ROWS", "2"))
-    if os.getenv("PDF_LAYOUT_PRESET", "").strip().upper() == "GRUPO1" or os.getenv("PDF_LAYOUT_SPEC", "").strip():
-        slots = 8
-    pages = [imgs[i:i+slots] for i in range(0, len(imgs), slots)]
-    header = os.getenv("PDF_HEADER", "")
-    return _save_pdf(pages, out_path, title_header=header)
+    tmpdir = tempfile.mkdtemp(prefix="lili_pdf_")
+    try:
+        imgs, notes = _collect_images_from_series(series_dir, max_per_series=8, tmpdir=tmpdir)
+        header = _PDF_HEADER
+        if not imgs:
+            return _save_empty_pdf(out_path, header, notes)
+        slots = _slots_per_page()
+        pages = [imgs[i:i+slots] for i in range(0, len(imgs), slots)]
+        return _save_pdf(pages, out_path, title_header=header)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
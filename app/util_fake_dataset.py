@@ -1,6 +1,8 @@
 """Cria um dataset DICOM fake para testes rápidos da UI/PDF/ZIP."""
 
 import os
+import struct
+import zlib
 from datetime import datetime
 from pathlib import Path
 
@@ -17,18 +19,39 @@ DEFAULT_STORE = Path(os.getenv("STORE_DIR", Path(__file__).parent / "storage")).
 
 
 def _create_sample_image(width: int = 640, height: int = 480) -> np.ndarray:
-    x = np.linspace(0, 1, width)
-    y = np.linspace(0, 1, height)
-    xv, yv = np.meshgrid(x, y)
-    gradient = ((xv + yv) / 2.0) * 255.0
-    circle = ((xv - 0.5) ** 2 + (yv - 0.5) ** 2) < 0.15
+    # Row/column vectors broadcast to H x W; only the gradient and mask are full-size.
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    gradient = (x + y) * np.float32(255.0 / 2.0)
+    circle = ((x - 0.5) ** 2 + (y - 0.5) ** 2) < 0.15
     gradient[circle] = 255
     return gradient.astype(np.uint8)
 
 
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+def _fast_png_write(pixels: np.ndarray, path: Path) -> None:
+    """Grayscale uint8 PNG: filter 0 on every row, a single IDAT at zlib level 1."""
+    height, width = pixels.shape
+    raw = np.zeros((height, width + 1), dtype=np.uint8)  # column 0 = filter byte
+    raw[:, 1:] = pixels
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    path.write_bytes(
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", ihdr)
+        + _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), 1))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
 def _save_preview(pixels: np.ndarray, preview_path: Path) -> None:
     preview_path.parent.mkdir(parents=True, exist_ok=True)
-    Image.fromarray(pixels).convert("RGB").save(preview_path, format="PNG", optimize=True)
+    if pixels.dtype == np.uint8 and pixels.ndim == 2:
+        _fast_png_write(pixels, preview_path)
+        return
+    Image.fromarray(pixels).convert("RGB").save(preview_path, format="PNG", compress_level=1)
 
 
 def _build_dataset(pixels: np.ndarray) -> FileDataset:
@@ -1,7 +1,13 @@
 import os
 bind = f"0.0.0.0:{os.getenv('WEB_PORT','8080')}"
+# O listener DICOM sobe na importação do app: cada worker tentaria abrir DICOM_PORT.
+# Por isso um único processo; a concorrência vem das threads (gthread) e dos pools internos.
+# Sem preload_app: o master importaria o app e o listener/pools ficariam no processo errado após o fork.
 workers = 1
+worker_class = "gthread"
 threads = int(os.getenv("GUNICORN_THREADS","4"))
+# heartbeat do worker em tmpfs, sem tocar o disco
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
 timeout = int(os.getenv("GUNICORN_TIMEOUT","90"))
 accesslog = "logs/gunicorn.access.log"
 errorlog = "logs/gunicorn.error.log"
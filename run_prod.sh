@@ -16,6 +16,6 @@ export PRINT_DIRECT="${PRINT_DIRECT:-1}"
 export PRINTER_NAME="${PRINTER_NAME:-}"
 export ALLOW_IPS="${ALLOW_IPS:-127.0.0.1,::1}"
 
-mkdir -p "$STORE_DIR"
+mkdir -p "$STORE_DIR" logs
 
-python app/dicom_server.py
+exec gunicorn -c gunicorn.conf.py wsgi:app